@@ -0,0 +1,152 @@
+# cython: language_level=3
+"""ProgressInfoの書き込み側の処理(update_valueとバイナリへの書き込み)をCで実装した高速版
+ビルド方法 (リポジトリのルートで実行する):
+    cythonize -i mpprogress/_fast.pyx
+ビルドされていない環境ではmpprogress.ProgressInfoが代わりに使われる
+NOTE:
+    _ProgressRecのメモリ配置はmpprogress.WIRE_FORMATと一致させること
+    EMA_ALPHAはmpprogress.ProgressInfo._EMA_ALPHAと一致させること
+    (レコードの大きさとEMA_ALPHAは読み込み時に確認され、食い違う場合はmpprogress.ProgressInfoが使われる)
+    WIRE_FORMATはリトルエンディアンなので、ビッグエンディアン環境ではImportErrorとして扱いpure-Python版に任せる
+"""
+import sys
+from libc.stdint cimport int32_t, int64_t
+from libc.string cimport memcpy, memset
+from posix.time cimport clock_gettime, timespec, CLOCK_MONOTONIC
+
+if sys.byteorder != "little":
+    raise ImportError("mpprogress._fast requires a little-endian platform")
+
+cdef packed struct _ProgressRec:
+    int32_t closed
+    int64_t min_value
+    int64_t max_value
+    int64_t count
+    int64_t start_time
+    int64_t last_update
+    int64_t now_update
+    double update_time_average
+    char padding[4]
+
+cdef double _EMA_ALPHA = 0.2
+EMA_ALPHA = _EMA_ALPHA
+
+cdef inline int64_t _monotonic_ns():
+    cdef timespec ts
+    clock_gettime(CLOCK_MONOTONIC, &ts)
+    return <int64_t>ts.tv_sec * 1000000000LL + ts.tv_nsec
+
+cdef class ProgressInfoFast:
+    """ProgressInfoと同じインタフェースを持つ書き込み側の進捗情報
+    (load_from_bytes, load_fromは持たない)
+    """
+    cdef _ProgressRec rec
+
+    def __init__(self):
+        memset(&self.rec, 0, sizeof(_ProgressRec))
+        self.rec.start_time = _monotonic_ns()
+        self.rec.last_update = self.rec.start_time
+        self.rec.now_update = self.rec.start_time
+        self.rec.update_time_average = 0.0
+
+    def update_value(self, int64_t count):
+        cdef int64_t proceed_count = count - self.rec.count
+        cdef double inst
+        self.rec.last_update = self.rec.now_update
+        self.rec.count = count
+        self.rec.now_update = _monotonic_ns()
+        if proceed_count > 0:
+            inst = (self.rec.now_update - self.rec.last_update) * 1e-9 / proceed_count
+            if self.rec.update_time_average == 0.0:
+                self.rec.update_time_average = inst
+            else:
+                self.rec.update_time_average = _EMA_ALPHA * inst + (1 - _EMA_ALPHA) * self.rec.update_time_average
+
+    def close(self):
+        self.rec.closed = 1
+
+    def calc_byte_length(self):
+        return sizeof(_ProgressRec)
+
+    def pack_into(self, buffer, Py_ssize_t offset=0):
+        """バッファに直接書き込む
+        """
+        cdef unsigned char[::1] view = buffer
+        if offset < 0 or offset + <Py_ssize_t>sizeof(_ProgressRec) > view.shape[0]:
+            raise ValueError("buffer is too small")
+        memcpy(&view[offset], &self.rec, sizeof(_ProgressRec))
+
+    def dump_to_bytes(self):
+        return (<char*>&self.rec)[:sizeof(_ProgressRec)]
+
+    @property
+    def closed(self):
+        return self.rec.closed
+
+    @closed.setter
+    def closed(self, int32_t value):
+        self.rec.closed = value
+
+    @property
+    def min_value(self):
+        return self.rec.min_value
+
+    @min_value.setter
+    def min_value(self, int64_t value):
+        self.rec.min_value = value
+
+    @property
+    def max_value(self):
+        return self.rec.max_value
+
+    @max_value.setter
+    def max_value(self, int64_t value):
+        self.rec.max_value = value
+
+    @property
+    def count(self):
+        return self.rec.count
+
+    @count.setter
+    def count(self, int64_t value):
+        self.rec.count = value
+
+    @property
+    def start_time(self):
+        return self.rec.start_time
+
+    @property
+    def last_update(self):
+        return self.rec.last_update
+
+    @property
+    def now_update(self):
+        return self.rec.now_update
+
+    @property
+    def update_time_average(self):
+        return self.rec.update_time_average
+
+    @property
+    def relative_count(self):
+        return self.rec.count - self.rec.min_value
+
+    @property
+    def total_count(self):
+        return self.rec.max_value - self.rec.min_value
+
+    @property
+    def time_diff(self):
+        return (self.rec.now_update - self.rec.last_update) * 1e-9
+
+    @property
+    def percentage(self):
+        return 0.0 if self.rec.max_value == self.rec.min_value else 100.0 * (self.rec.count - self.rec.min_value) / (self.rec.max_value - self.rec.min_value)
+
+    @property
+    def eta(self):
+        return (self.rec.max_value - self.rec.count) * self.rec.update_time_average
+
+    @property
+    def elapsed(self):
+        return (self.rec.now_update - self.rec.start_time) * 1e-9
@@ -1,47 +1,179 @@
 """subprocess等で複数プロセスにまたがるプログラムを利用するときに進捗を伝達するためのライブラリ
+NOTE:
+    書き込み側の高速版(mpprogress/_fast.pyx)を使う場合はCythonでビルドしておく
+        cythonize -i mpprogress/_fast.pyx
+    ビルドされていない、またはビルドがこのモジュールと食い違う場合はpure-Pythonの実装が使われる
+    任意の依存パッケージ
+        numpy: ProgressGroupで使用する
+        posix_ipc: 更新を名前付きセマフォで読み取り側に通知する (無い場合、ProgressView.waitはスリープで待つ)
 """
 import os
-import datetime
 import time
+import hashlib
 import struct
 import mmap
-import tempfile
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    import posix_ipc
+except ImportError:
+    posix_ipc = None
 
-def get_temp_path(name):
-    tempdir = tempfile.gettempdir()
-    return os.path.join(tempdir, "mpprogress.{}.tmp".format(name))
+WIRE_FORMAT = """共有メモリ上のバイナリ形式 (全てリトルエンディアン・固定長で、プラットフォームやPythonのビルドに依存しない)
+    オフセット  サイズ  内容
+    0           8       書き込み済みレコード数 (u64, 0は未書き込み)
+    8           56      パディング (ヘッダをキャッシュライン1本に収める)
+    64 + 64*i   64      スロットi (i = 0..7, n件目のレコードはスロット(n - 1) % 8)
+スロット内のレコード:
+    0           4       closed (i32)
+    4           8       min_value (i64)
+    12          8       max_value (i64)
+    20          8       count (i64)
+    28          8       start_time (i64, time.monotonic_ns)
+    36          8       last_update (i64, time.monotonic_ns)
+    44          8       now_update (i64, time.monotonic_ns)
+    52          8       update_time_average (f64, 秒)
+    60          4       パディング (レコードをキャッシュライン1本に揃える)
+"""
+
+_CACHE_LINE = 64
+# 進捗情報のバイナリ形式 (WIRE_FORMATを参照、更新のたびに書式を解析しないよう一度だけコンパイルしておく)
+# 1レコードがキャッシュライン1本に収まり、隣のレコードと同じラインを共有しないよう末尾をパディングする
+_PROGRESS_STRUCT = struct.Struct("<iqqqqqqd4x")
+_PROGRESS_SIZE = _PROGRESS_STRUCT.size
+# 共有メモリの配置: 先頭のキャッシュライン1本に書き込み済みレコード数(u64)を置き、
+# その後にキャッシュライン境界に揃えた_RING_SLOTS個のスロットをリングバッファとして並べる
+# 共有メモリ自体はページ境界(mmap.ALLOCATIONGRANULARITY)から割り当てられるので、各スロットはキャッシュライン境界に乗る
+# NOTE:
+#     書き込み側と読み取り側のプロセスは同じソケットの別コアに固定(os.sched_setaffinity等)すると最も効率が良い
+_INDEX_STRUCT = struct.Struct("<Q")
+_HEADER_SIZE = _CACHE_LINE
+_RING_SLOTS = 8
+_RING_MASK = _RING_SLOTS - 1
+_SLOT_SIZE = (_PROGRESS_SIZE + _CACHE_LINE - 1) // _CACHE_LINE * _CACHE_LINE
+_SHARED_SIZE = _HEADER_SIZE + _RING_SLOTS * _SLOT_SIZE
+if np is not None:
+    # _PROGRESS_STRUCTと同じ配置の構造化dtype (ProgressGroupで使用)
+    _PROGRESS_DTYPE = np.dtype({
+        "names": [
+            "closed", "min_value", "max_value", "count",
+            "start_time", "last_update", "now_update", "update_time_average",
+        ],
+        "formats": ["<i4", "<i8", "<i8", "<i8", "<i8", "<i8", "<i8", "<f8"],
+        "offsets": [0, 4, 12, 20, 28, 36, 44, 52],
+        "itemsize": _PROGRESS_SIZE,
+    })
+# 環境変数MPPROGRESS_DISABLE=1で進捗の共有を無効にする (MultiprocessedProgressがnull_progressを返す)
+_DISABLED = os.environ.get("MPPROGRESS_DISABLE") == "1"
+
+# POSIXの共有メモリ・セマフォ名の最大長 (macOSのPSHMNAMLEN, 先頭の/を含むバイト数)
+_IPC_NAME_MAX = 31
+
+def _fit_ipc_name(prefix, name):
+    """prefixとnameをつないだ名前を返す
+    _IPC_NAME_MAXを超える場合はnameをハッシュ(16文字)に置き換える (書き込み側と読み取り側で同じ名前になる)
+    """
+    ipc_name = f"{prefix}{name}"
+    if len(ipc_name.encode()) + (not prefix.startswith("/")) <= _IPC_NAME_MAX:
+        return ipc_name
+    return f"{prefix}{hashlib.blake2b(name.encode(), digest_size=8).hexdigest()}"
+
+def get_shared_memory_name(name):
+    # SharedMemoryがPOSIXでは先頭に/を付ける
+    return _fit_ipc_name("mpprogress.", name)
+
+def get_event_name(name):
+    return _fit_ipc_name("/mpprogress.ev.", name)
+
+def _open_event(name):
+    """更新を通知するための名前付きセマフォを開く
+    posix_ipcが無い、またはタイムアウト付きの待機ができない環境ではNoneを返す
+    """
+    if posix_ipc is None or not posix_ipc.SEMAPHORE_TIMEOUT_SUPPORTED:
+        return None
+    try:
+        return posix_ipc.Semaphore(get_event_name(name))
+    except posix_ipc.ExistentialError:
+        return None
 
-def timedelta_seconds(delta: datetime.timedelta):
-    return delta.seconds + delta.microseconds / 1000000
+def _create_event(name):
+    """更新を通知するための名前付きセマフォを作成する
+    (セマフォ, この呼び出しで新規に作成したか)を返す。既に存在する場合はそれを開き、
+    異常終了した書き込み側の通知が残って読み取り側を空振りで起こさないよう、値を0に戻す
+    NOTE:
+        共有メモリと違いresource_trackerには登録されないので、書き込み側が異常終了するとセマフォが残る
+    """
+    if posix_ipc is None or not posix_ipc.SEMAPHORE_TIMEOUT_SUPPORTED:
+        return None, False
+    try:
+        return posix_ipc.Semaphore(get_event_name(name), posix_ipc.O_CREX, initial_value=0), True
+    except posix_ipc.ExistentialError:
+        pass
+    event = _open_event(name)
+    if event is not None:
+        try:
+            while True:
+                event.acquire(0)
+        except posix_ipc.BusyError:
+            pass
+    return event, False
+
+# 共有メモリに設定するmadviseのフラグ
+# 決まった位置だけを読み書きするので先読みを止め(MADV_RANDOM)、コアダンプにも含めない(MADV_DONTDUMP, Linuxのみ)
+_MADVISE_FLAGS = tuple(
+    getattr(mmap, flag) for flag in ("MADV_RANDOM", "MADV_DONTDUMP") if hasattr(mmap, flag)
+)
+
+def _advise_shared_memory(shm):
+    """共有メモリのマッピングにmadviseを設定する (madviseが使えない環境では何もしない)
+    """
+    mm = getattr(shm, "_mmap", None)
+    if mm is None or not hasattr(mm, "madvise"):
+        return
+    for flag in _MADVISE_FLAGS:
+        try:
+            mm.madvise(flag)
+        except OSError:
+            pass
 
-def from_time_pair(ordinal: int, seconds: float):
-    dt = datetime.datetime.fromordinal(ordinal)
-    dt += datetime.timedelta(seconds=seconds)
+# このプロセスで作成した(resource_trackerに登録されている)共有メモリの名前
+_created_shared_memory = set()
 
-def to_time_pair(dt: datetime.datetime):
-    ordinal = dt.toordinal()
-    dt2 = datetime.datetime.fromordinal(ordinal)
-    seconds = timedelta_seconds(dt - dt2)
-    return (ordinal, seconds)
+def _attach_shared_memory(shm_name):
+    """既存の共有メモリを開く
+    読み取り側のプロセスが終了時に共有メモリを削除してしまわないよう、resource_trackerの管理から外す
+    (同じプロセスで作成した共有メモリは作成側の登録を残す)
+    """
+    shm = SharedMemory(name=shm_name, create=False)
+    if os.name == "posix" and shm_name not in _created_shared_memory:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    _advise_shared_memory(shm)
+    return shm
 
 class NameProvider:
     """一意な名前を設定するためのクラス
+    base_nameごとに次に使う連番を覚えておき、base_name, base_name0, base_name1, ...の順に払い出す
     """
     def __init__(self):
         self.name_table = set()
+        self._next = {}
     def get_name(self, base_name):
         """get progress names
         the function called when the progress started
         """
-        if base_name not in self.name_table:
-            self.name_table.add(base_name)
-            return base_name
-        for i in range(1000):
-            name = "{}{}".format(base_name, i)
-            if name not in  self.name_table:
-                self.name_table.add(name)
-                return name
-        raise RuntimeError("Name provider index exceeds limit")
+        n = self._next.get(base_name, 0)
+        name = base_name if n == 0 else f"{base_name}{n - 1}"
+        # 別のbase_nameから払い出された名前(例: "a"の連番と"a0")と衝突した場合は連番を進める
+        while name in self.name_table:
+            n += 1
+            name = f"{base_name}{n - 1}"
+        self._next[base_name] = n + 1
+        self.name_table.add(name)
+        return name
     def erase_name(self, name):
         """erase progress names
         the function called when the progress completed
@@ -51,42 +183,55 @@ class NameProvider:
 class ProgressInfo:
     """進捗情報をデータに保存するクラス
     NOTE:
-        進捗の時間はプロセス起動時基準なのでプロセスを超えてカウントを行うようなケースには対応していない
+        進捗の時間はtime.monotonic_ns()のナノ秒で保持する
+        モノトニック時計の基準点はOSに依存するので、マシンを超えてカウントを行うようなケースには対応していない
+        1件あたりの処理時間は固定係数の指数移動平均で平滑化する
     """
+    __slots__ = (
+        "closed", "min_value", "max_value", "count",
+        "start_time", "last_update", "now_update", "update_time_average",
+    )
+    _EMA_ALPHA = 0.2
+
     def __init__(self):
         self.closed = 0
         self.min_value = 0
         self.max_value = 0
         self.count = 0
-        self.start_time = datetime.datetime.now()
-        self.last_update = datetime.datetime.now()
-        self.now_update = datetime.datetime.now()
+        self.start_time = self.last_update = self.now_update = time.monotonic_ns()
         self.update_time_average = 0.0
 
     def update_value(self, count):
         last_count = self.count
         self.last_update = self.now_update
         self.count = count
-        self.now_update = datetime.datetime.now()
+        self.now_update = time.monotonic_ns()
         proceed_count = self.count - last_count
         time_diff = self._get_time_diff()
         if proceed_count > 0:
-            self.update_time_average += (time_diff / proceed_count - self.update_time_average) / self.count
+            inst = time_diff / proceed_count
+            if self.update_time_average == 0.0:
+                self.update_time_average = inst
+            else:
+                self.update_time_average = self._EMA_ALPHA * inst + (1 - self._EMA_ALPHA) * self.update_time_average
 
     def _get_relative_count(self):
         return self.count - self.min_value
 
     def _get_time_diff(self):
-        return timedelta_seconds(self.now_update - self.last_update)
+        return (self.now_update - self.last_update) * 1e-9
 
     def _get_percentage(self):
-        return 100 * (self.count - self.min_value) / (self.max_value - self.min_value)
+        total = self.max_value - self.min_value
+        if total == 0:
+            return 0.0
+        return 100 * (self.count - self.min_value) / total
 
     def _get_remaining_time(self):
         return (self.max_value - self.count) * self.update_time_average
 
     def _get_elapsed(self):
-        return timedelta_seconds(self.now_update - self.start_time)
+        return (self.now_update - self.start_time) * 1e-9
 
     def _get_total(self):
         return self.max_value - self.min_value
@@ -94,10 +239,17 @@ class ProgressInfo:
     def dump_to_bytes(self):
         """バイナリデータに変換
         """
-        d_times = tuple(map(to_time_pair, (self.start_time, self.last_update, self.now_update)))
-        return struct.pack("@illlidididd",
+        return _PROGRESS_STRUCT.pack(
             self.closed, self.min_value, self.max_value, self.count,
-            *d_times[0], *d_times[1], *d_times[2], self.update_time_average
+            self.start_time, self.last_update, self.now_update, self.update_time_average
+        )
+
+    def pack_into(self, buffer, offset=0):
+        """バッファに直接書き込む (中間のbytesを作らない)
+        """
+        _PROGRESS_STRUCT.pack_into(buffer, offset,
+            self.closed, self.min_value, self.max_value, self.count,
+            self.start_time, self.last_update, self.now_update, self.update_time_average
         )
 
     def close(self):
@@ -106,20 +258,21 @@ class ProgressInfo:
     def calc_byte_length(self):
         """バイナリにダンプした際のサイズを取得
         """
-        return struct.calcsize("@illlidididd")
+        return _PROGRESS_SIZE
 
     def load_from_bytes(self, buffer):
         """バイナリデータからロード
         """
-        unpacked = struct.unpack("@illlidididd", buffer)
-        (self.closed, self.min_value, self.max_value,
-            self.count, d_times, self.update_time_average) = (
-                *unpacked[0:4], unpacked[4:10], unpacked[10]
-        )
-        (self.start_time, self.last_update, self.now_update) = map(
-            lambda d:from_time_pair(*d), (d_times[0:2], d_times[2:4], d_times[4:6])
-        )
-        
+        (self.closed, self.min_value, self.max_value, self.count,
+            self.start_time, self.last_update, self.now_update,
+            self.update_time_average) = _PROGRESS_STRUCT.unpack(buffer)
+
+    def load_from(self, buffer, offset=0):
+        """バッファから直接ロード (中間のbytesを作らない)
+        """
+        (self.closed, self.min_value, self.max_value, self.count,
+            self.start_time, self.last_update, self.now_update,
+            self.update_time_average) = _PROGRESS_STRUCT.unpack_from(buffer, offset)
 
     elapsed = property(_get_elapsed)
     eta = property(_get_remaining_time)
@@ -128,33 +281,119 @@ class ProgressInfo:
     total_count = property(_get_total)
     relative_count = property(_get_relative_count)
 
+try:
+    # Cythonでビルドされた高速版があれば書き込み側で使う
+    from . import _fast
+except ImportError:
+    _fast = None
+# レコードの大きさや平滑化係数が食い違う古いビルドは使わない (壊れたレコードを書き込まないよう黙ってpure-Python版に任せる)
+if (_fast is not None
+        and _fast.ProgressInfoFast().calc_byte_length() == _PROGRESS_SIZE
+        and getattr(_fast, "EMA_ALPHA", None) == ProgressInfo._EMA_ALPHA):
+    _WriterProgressInfo = _fast.ProgressInfoFast
+else:
+    _WriterProgressInfo = ProgressInfo
+
 class ProgressView:
-    """メモリマップファイルを利用した進捗内容の共有インタフェース
+    """共有メモリを利用した進捗内容の共有インタフェース
     書き込みを行うインタフェースにはwritableを設定しておく
+    NOTE:
+        共有メモリは最初に開いたものを使い回し、deleteまたはcloseで解放する
+        進捗はリングバッファに書き込み、書き込み済みレコード数nを最後に公開する (n件目はスロット(n - 1) % _RING_SLOTSに入る)
+        読み取り側は読み取り前後のレコード数の差から、読んでいる間にスロットが上書きされていないことを確認する
+        (x86のようにストアの順序が保たれるCPUを前提とする)
+        posix_ipcが使える環境では、書き込み側は更新のたびに名前付きセマフォで通知し、読み取り側はwaitでそれを待つ
+        セマフォは1つの進捗の全ての読み取り側で共有され、1回の通知で起きるのは1つの読み取り側だけ(単一コンシューマ)
+        他の読み取り側はwaitのtimeout(既定ではpoll_interval)まで待ってから読み取る
     """
     def __init__(self, name, writable=False):
         self.name = name
-        self.tempname_path = get_temp_path(self.name)
+        self.shm_name = get_shared_memory_name(self.name)
         self.writable = writable
+        self._shm = None
+        self._event = None
+        self._count = 0
 
     def update(self, progress: ProgressInfo):
-        """メモリマップファイルに書き込んで共有する進捗内容を更新する
+        """共有メモリに書き込んで共有する進捗内容を更新する
         """
         if not self.writable:
             raise ValueError("the view is not writable")
-        with open(self.tempname_path, "r+b") as fp:
-            with mmap.mmap(fp.fileno(), 0) as mm:
-                mm.write(progress.dump_to_bytes())
+        buf = self._shm.buf
+        count = self._count + 1
+        progress.pack_into(buf, _HEADER_SIZE + ((count - 1) & _RING_MASK) * _SLOT_SIZE)
+        _INDEX_STRUCT.pack_into(buf, 0, count)
+        self._count = count
+        event = self._event
+        if event is not None and (not posix_ipc.SEMAPHORE_VALUE_SUPPORTED or event.value == 0):
+            event.release()
 
     def initialize(self):
-        with open(self.tempname_path, "wb") as fp:
-            for i in range(ProgressInfo().calc_byte_length()):
-                fp.write(b" ")
+        """共有メモリを確保する
+        確保した領域はOSによってゼロで埋められるので、初期値の書き込みは行わない
+        (レコード数0は未書き込みを表す)
+        読み取り側が共有メモリを開いた時点で通知用のセマフォが存在するよう、セマフォを先に作成する
+        共有メモリの作成に失敗した場合(同名の共有メモリが既にある場合など)は、セマフォを閉じ、この呼び出しで作成したものなら削除する
+        """
+        event, created = _create_event(self.name)
+        try:
+            self._shm = SharedMemory(name=self.shm_name, create=True, size=_SHARED_SIZE)
+        except BaseException:
+            if event is not None:
+                if created:
+                    event.unlink()
+                event.close()
+            raise
+        self._event = event
+        _created_shared_memory.add(self.shm_name)
+        _advise_shared_memory(self._shm)
+        self._count = 0
+
+    def _attach(self):
+        # 同じ名前で作り直された共有メモリを開いた場合に備え、drainの読み取り位置を先頭に戻す
+        self._shm = _attach_shared_memory(self.shm_name)
+        self._count = 0
+        self._event = _open_event(self.name)
+
+    def close(self):
+        """開いている共有メモリとセマフォを閉じる
+        """
+        if self._shm is not None:
+            self._shm.close()
+            self._shm = None
+        if self._event is not None:
+            self._event.close()
+            self._event = None
 
     def delete(self):
         if not self.writable:
             raise ValueError("the view is not writable")
-        os.remove(self.tempname_path)
+        shm = self._shm
+        event = self._event
+        self._event = None
+        self.close()
+        shm.unlink()
+        _created_shared_memory.discard(self.shm_name)
+        if event is not None:
+            event.unlink()
+            event.close()
+
+    def wait(self, timeout=None, poll_interval=0.05):
+        """書き込み側の次の更新を最大timeout秒(Noneの場合はpoll_interval秒)待つ
+        通知用のセマフォが使えない場合はpoll_interval秒スリープする
+        NOTE:
+            通知は単一コンシューマなので、読み取り側が複数ある場合に通知を受けられなかった側は
+            timeout秒待つことになる。timeoutを既定より長くするのは読み取り側が1つの場合に限る
+        """
+        if self._event is None:
+            time.sleep(poll_interval)
+            return
+        if timeout is None:
+            timeout = poll_interval
+        try:
+            self._event.acquire(timeout)
+        except posix_ipc.BusyError:
+            pass
 
     def __enter__(self):
         return self
@@ -162,24 +401,127 @@ class ProgressView:
     def __exit__(self, exc_type, exc_value, traceback):
         if self.writable:
             self.delete()
+        else:
+            self.close()
 
     def get(self):
-        """共有された進捗内容をメモリマップファイルから読み取る
+        """共有された進捗内容を共有メモリから読み取る
+        書き込み側が終了(closed)した進捗を読み取った時点で共有メモリを閉じる
+        書き込み側がまだ一度もupdateしていない場合はNoneを返す
         """
         try:
-            with open(self.tempname_path, "rb") as fp:
-                with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
-                    progress = ProgressInfo()
-                    progress.load_from_bytes(mm.read(progress.calc_byte_length()))
+            if self._shm is None:
+                self._attach()
+            progress = ProgressInfo()
+            buf = self._shm.buf
+            while True:
+                count = _INDEX_STRUCT.unpack_from(buf, 0)[0]
+                if count == 0:
+                    return None
+                progress.load_from(buf, _HEADER_SIZE + ((count - 1) & _RING_MASK) * _SLOT_SIZE)
+                if _INDEX_STRUCT.unpack_from(buf, 0)[0] - count < _RING_MASK:
+                    break
         except OSError:
             return None
         except ValueError:
             return None
+        if progress.closed:
+            self.close()
         return progress
 
+    def drain(self):
+        """前回のdrain以降に書き込まれた進捗を古い順にまとめて読み取る
+        リングバッファに残っている最大_RING_SLOTS - 1件までで、それより古いものは失われる
+        """
+        try:
+            if self._shm is None:
+                self._attach()
+            buf = self._shm.buf
+            end = _INDEX_STRUCT.unpack_from(buf, 0)[0]
+            start = max(self._count, end - _RING_MASK)
+            progresses = []
+            for count in range(start + 1, end + 1):
+                progress = ProgressInfo()
+                progress.load_from(buf, _HEADER_SIZE + ((count - 1) & _RING_MASK) * _SLOT_SIZE)
+                progresses.append(progress)
+            # 読んでいる間に上書きされた可能性のあるスロットを捨てる
+            overwritten = _INDEX_STRUCT.unpack_from(buf, 0)[0] - _RING_MASK - start
+            if overwritten > 0:
+                del progresses[:overwritten]
+            self._count = end
+        except OSError:
+            return []
+        except ValueError:
+            return []
+        if progresses and progresses[-1].closed:
+            self.close()
+        return progresses
+
+    def read_into(self, out, offset=0):
+        """共有された進捗内容のバイナリをoutのoffsetの位置へそのままコピーする
+        読み取れなかった場合はFalseを返す
+        """
+        try:
+            if self._shm is None:
+                self._attach()
+            buf = self._shm.buf
+            dest = memoryview(out)[offset:offset + _PROGRESS_SIZE]
+            while True:
+                count = _INDEX_STRUCT.unpack_from(buf, 0)[0]
+                if count == 0:
+                    return False
+                slot = _HEADER_SIZE + ((count - 1) & _RING_MASK) * _SLOT_SIZE
+                dest[:] = buf[slot:slot + _PROGRESS_SIZE]
+                if _INDEX_STRUCT.unpack_from(buf, 0)[0] - count < _RING_MASK:
+                    break
+        except OSError:
+            return False
+        except ValueError:
+            return False
+        if _PROGRESS_STRUCT.unpack_from(dest)[0]:
+            self.close()
+        return True
+
     def exists(self):
-        return os.path.exists(self.tempname_path)
+        if self._shm is not None:
+            return True
+        try:
+            _attach_shared_memory(self.shm_name).close()
+        except OSError:
+            return False
+        return True
         
+class ProgressGroup:
+    """複数の進捗をまとめて読み取るクラス
+    各進捗のバイナリを1つのnumpyの構造化配列へ直接コピーし、割合や残り時間を配列演算で求める
+    NOTE:
+        numpyが必要
+    """
+    def __init__(self, views):
+        if np is None:
+            raise ImportError("ProgressGroup requires numpy")
+        self.views = list(views)
+
+    def read_all(self):
+        """全ての進捗を_PROGRESS_DTYPEの構造化配列として読み取る
+        読み取れなかった進捗の行はゼロのまま返す
+        """
+        records = np.zeros(len(self.views), dtype=_PROGRESS_DTYPE)
+        raw = records.view(np.uint8)
+        for i, view in enumerate(self.views):
+            view.read_into(raw, i * _PROGRESS_SIZE)
+        return records
+
+    @staticmethod
+    def percentage(records):
+        total = records["max_value"] - records["min_value"]
+        relative = records["count"] - records["min_value"]
+        return np.where(total != 0, 100 * relative / np.where(total != 0, total, 1), 0.0)
+
+    @staticmethod
+    def remaining_time(records):
+        return (records["max_value"] - records["count"]) * records["update_time_average"]
+
 class ProgressBase:
     def __init__(self, min_value=0, max_value=0):
         pass
@@ -188,27 +530,57 @@ class ProgressBase:
     def finish(self):
         pass
 
+class NullProgress(ProgressBase):
+    """進捗を共有しない場合に使うダミーの進捗
+    update, finishはProgressBaseと同じく何もしない
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.finish()
+
 class MultiprocessedProgress(ProgressBase):
     """
+    NOTE:
+        updateは進捗を常にメモリ上で更新するが、共有メモリへの書き込みは
+        前回の書き込みからmin_interval秒経過したとき、または(max_valueが設定されていれば)初めてmax_valueに到達したときに限る
+        そのため間隔内に行った最後のupdateは、次のupdateかfinishが呼ばれるまで読み取り側に公開されない
+        環境変数MPPROGRESS_DISABLE=1が設定されている場合は生成せずnull_progressを返す
     """
-    def __init__(self, name, min_value=0, max_value=0):
+    def __new__(cls, *args, **kwargs):
+        if _DISABLED:
+            return null_progress
+        return super().__new__(cls)
+
+    def __init__(self, name, min_value=0, max_value=0, min_interval=0.02):
         super().__init__(min_value=min_value, max_value=max_value)
         self.name = main_name_provider.get_name(name)
         self.interface = ProgressView(self.name, writable=True)
-        self.info = ProgressInfo()
+        self.info = _WriterProgressInfo()
         self.info.min_value = min_value
         self.info.max_value = max_value
         self.info.count = min_value
+        self._min_interval_ns = int(min_interval * 1e9)
         self.interface.initialize()
         self.interface.update(self.info)
+        self._last_flush_ns = self.info.now_update
+        self._last_flush_count = min_value
 
     def update(self, count):
-        self.info.update_value(count)
-        self.interface.update(self.info)
+        info = self.info
+        info.update_value(count)
+        now = info.now_update
+        if now - self._last_flush_ns >= self._min_interval_ns or (
+                info.max_value > info.min_value and count >= info.max_value > self._last_flush_count):
+            self.interface.update(info)
+            self._last_flush_ns = now
+            self._last_flush_count = count
 
     def finish(self):
-        self.interface.delete()
         self.info.close()
+        self.interface.update(self.info)
+        self.interface.delete()
 
     def __enter__(self):
         return self
@@ -216,4 +588,5 @@ class MultiprocessedProgress(ProgressBase):
     def __exit__(self, exc_type, exc_value, traceback):
         self.finish()
 
-main_name_provider = NameProvider()
\ No newline at end of file
+main_name_provider = NameProvider()
+null_progress = NullProgress()
\ No newline at end of file
@@ -29,7 +29,7 @@ def server_read_sub(name):
         else:
             if opened:
                 closed = True
-        time.sleep(0.05)
+        reader.wait()
     print("読み込みが終了しました")    
 
 def server_main(name):